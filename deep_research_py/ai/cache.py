@@ -0,0 +1,274 @@
+import asyncio
+import functools
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import openai
+from diskcache import Cache
+from loguru import logger
+
+from .providers import openai_client
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+CACHE_DIR = os.environ.get(
+    "DEEP_RESEARCH_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "deep-research-py"),
+)
+
+_disk = Cache(CACHE_DIR)
+_MISSING = object()
+# Cleared once the endpoint turns out not to support embeddings (e.g. third-party
+# OpenAI compatible APIs), so we don't pay for a failing request on every lookup.
+_embeddings_available = True
+
+
+def normalize(text: str) -> str:
+    """Lowercases and collapses whitespace so trivial variations share a key."""
+    return " ".join(text.lower().split())
+
+
+# Recently computed embeddings, keyed on (embedding model, normalized text). Nested
+# cached helpers (generate_feedback -> search) embed the same query more than once.
+EMBED_CACHE_SIZE = 256
+_embed_cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+_embed_inflight: "Dict[Tuple[str, str], asyncio.Future]" = {}
+
+
+async def embed(text: str) -> Optional[np.ndarray]:
+    """Returns the unit-normalized embedding of `text`, or None if unavailable."""
+    if not _embeddings_available or not text:
+        return None
+    cache_key = (EMBEDDING_MODEL, text)
+    if cache_key in _embed_cache:
+        _embed_cache.move_to_end(cache_key)
+        return _embed_cache[cache_key]
+
+    # Concurrent callers for the same text share a single request
+    task = _embed_inflight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_request_embedding(text))
+        _embed_inflight[cache_key] = task
+    try:
+        vector = await asyncio.shield(task)
+    finally:
+        _embed_inflight.pop(cache_key, None)
+
+    if vector is not None:
+        _embed_cache[cache_key] = vector
+        _embed_cache.move_to_end(cache_key)
+        if len(_embed_cache) > EMBED_CACHE_SIZE:
+            _embed_cache.popitem(last=False)
+    return vector
+
+
+async def _request_embedding(text: str) -> Optional[np.ndarray]:
+    global _embeddings_available
+    try:
+        response = await openai_client.embeddings.create(
+            model=EMBEDDING_MODEL, input=text
+        )
+    except (openai.NotFoundError, openai.BadRequestError) as e:
+        # The endpoint or model doesn't support embeddings, retrying won't help
+        logger.warning(f"Embeddings unavailable, semantic cache disabled: {e}")
+        _embeddings_available = False
+        return None
+    except Exception as e:
+        # Timeouts, rate limits, 5xx: skip the semantic lookup for this call only
+        logger.warning(f"Embedding request failed, skipping semantic cache: {e}")
+        return None
+    vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class SemanticCache:
+    """Two-level cache: exact match on the normalized text, then nearest neighbour
+    on its embedding. Entries are persisted with diskcache so they survive restarts,
+    and expire after `ttl` seconds when one is given."""
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = 2048,
+        threshold: float = 0.92,
+        ttl: Optional[float] = None,
+    ):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        # Values are stored as (expires_at, value); expires_at is None without a ttl
+        self._exact: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._buckets: Dict[
+            str, Tuple[List[str], Optional[np.ndarray], List[Tuple[Optional[float], Any]]]
+        ] = {}
+
+    def bucket(self, model: str, variant: str = "") -> str:
+        # Stored vectors are only comparable with vectors from the same embedding model
+        return f"{self.namespace}:{model}:{EMBEDDING_MODEL}:{variant}"
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl is not None else None
+
+    @staticmethod
+    def _expired(expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at <= time.time()
+
+    def _remember(self, key: str, entry: Tuple[Optional[float], Any]) -> None:
+        self._exact[key] = entry
+        self._exact.move_to_end(key)
+        if len(self._exact) > self.maxsize:
+            self._exact.popitem(last=False)
+
+    def get(self, bucket: str, digest: str) -> Any:
+        key = f"{bucket}:{digest}"
+        entry = self._exact.get(key)
+        if entry is None:
+            entry = _disk.get(("exact", key))
+            if entry is None:
+                return _MISSING
+            self._remember(key, entry)
+        if self._expired(entry[0]):
+            del self._exact[key]
+            return _MISSING
+        self._exact.move_to_end(key)
+        return entry[1]
+
+    def _load(
+        self, bucket: str
+    ) -> Tuple[List[str], Optional[np.ndarray], List[Tuple[Optional[float], Any]]]:
+        if bucket not in self._buckets:
+            digests, vectors, values = [], [], []
+            for digest in _disk.get(("index", bucket), default=[]):
+                entry = _disk.get(("semantic", bucket, digest))
+                if entry is not None:
+                    digests.append(digest)
+                    vectors.append(entry[0])
+                    values.append((entry[1], entry[2]))
+            matrix = np.vstack(vectors) if vectors else None
+            self._buckets[bucket] = (digests, matrix, values)
+        return self._buckets[bucket]
+
+    def get_similar(self, bucket: str, vector: np.ndarray) -> Any:
+        _, matrix, values = self._load(bucket)
+        if matrix is None or matrix.shape[1] != vector.shape[0]:
+            return _MISSING
+        scores = matrix @ vector
+        if self.ttl is not None:
+            expired = np.array([self._expired(expires_at) for expires_at, _ in values])
+            scores[expired] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return values[best][1]
+        return _MISSING
+
+    def put(
+        self, bucket: str, digest: str, vector: Optional[np.ndarray], value: Any
+    ) -> None:
+        key = f"{bucket}:{digest}"
+        expires_at = self._expires_at()
+        self._remember(key, (expires_at, value))
+        _disk.set(("exact", key), (expires_at, value), expire=self.ttl)
+        if vector is None:
+            return
+
+        digests, matrix, values = self._load(bucket)
+        if matrix is not None and matrix.shape[1] != vector.shape[0]:
+            # Vectors from a different embedding model, start the bucket over
+            digests, matrix, values = [], None, []
+        if digest in digests:
+            # Re-storing a query (e.g. after its entry expired) replaces the old row
+            i = digests.index(digest)
+            digests = digests[:i] + digests[i + 1 :]
+            values = values[:i] + values[i + 1 :]
+            matrix = np.delete(matrix, i, axis=0) if digests else None
+        digests = digests + [digest]
+        values = values + [(expires_at, value)]
+        matrix = vector[None, :] if matrix is None else np.vstack([matrix, vector])
+        for evicted in digests[: -self.maxsize]:
+            _disk.delete(("semantic", bucket, evicted))
+        digests, matrix, values = (
+            digests[-self.maxsize :],
+            matrix[-self.maxsize :],
+            values[-self.maxsize :],
+        )
+        self._buckets[bucket] = (digests, matrix, values)
+        _disk.set(("semantic", bucket, digest), (vector, expires_at, value), expire=self.ttl)
+        _disk.set(("index", bucket), digests)
+
+
+def semantic_cache(
+    namespace: str,
+    model_env: Optional[str] = None,
+    default_model: str = "",
+    threshold: float = 0.92,
+    maxsize: int = 2048,
+    ttl: Optional[float] = None,
+    key: Optional[Callable[..., Tuple[str, str]]] = None,
+    cache_if: Callable[[Any], bool] = bool,
+    semantic: bool = True,
+) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """Caches an async LLM or search helper on its query text.
+
+    Args:
+        namespace: Cache namespace, usually the function name
+        model_env: Env var holding the model name; changing it invalidates the cache
+        default_model: Model used when `model_env` is unset
+        threshold: Minimum cosine similarity for a semantic hit
+        maxsize: Max entries kept per bucket
+        ttl: Seconds before an entry expires, None to keep it until evicted
+        key: Maps the call arguments to (query text, variant); calls only share
+            entries when their variants are equal. Defaults to the first argument.
+        cache_if: Decides whether a result is worth caching. By default empty
+            results are skipped, they usually mean the call failed.
+        semantic: Whether to look up (and embed) similar queries at all. Disable it
+            for results that are only valid for their exact input.
+
+    The wrapped function also accepts `use_semantic_cache=False` to allow exact
+    hits only, for callers that need results for this exact query.
+    """
+    cache = SemanticCache(namespace, maxsize=maxsize, threshold=threshold, ttl=ttl)
+
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(*args, use_semantic_cache: bool = True, **kwargs):
+            text, variant = key(*args, **kwargs) if key else (args[0], "")
+            text = normalize(text)
+            model = os.getenv(model_env, default_model) if model_env else default_model
+            bucket = cache.bucket(model, variant)
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+            # The cache is an optimization only: any failure in it falls through
+            # to the real call instead of failing the caller.
+            vector = None
+            try:
+                value = cache.get(bucket, digest)
+                if value is not _MISSING:
+                    logger.info(f"Cache hit ({namespace}): {text[:80]}")
+                    return value
+
+                if semantic:
+                    vector = await embed(text)
+                if vector is not None and use_semantic_cache:
+                    value = cache.get_similar(bucket, vector)
+                    if value is not _MISSING:
+                        logger.info(f"Semantic cache hit ({namespace}): {text[:80]}")
+                        return value
+            except Exception as e:
+                logger.warning(f"Cache lookup failed ({namespace}): {e}")
+
+            value = await func(*args, **kwargs)
+            if cache_if(value):
+                try:
+                    cache.put(bucket, digest, vector, value)
+                except Exception as e:
+                    logger.warning(f"Cache store failed ({namespace}): {e}")
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -1,4 +1,6 @@
 import os
+from functools import lru_cache
+
 import tiktoken
 from typing import Optional
 from .text_splitter import RecursiveCharacterTextSplitter
@@ -7,8 +9,10 @@ from .text_splitter import RecursiveCharacterTextSplitter
 import openai
 
 
-def create_openai_client(api_key: str, base_url: Optional[str] = None) -> openai.OpenAI:
-    return openai.OpenAI(
+def create_openai_client(
+    api_key: str, base_url: Optional[str] = None
+) -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(
         api_key=api_key, base_url=base_url or "https://api.openai.com/v1"
     )
 
@@ -28,16 +32,57 @@ except Exception as e:
     print(f"Error initializing OpenAI client: {e}")
     raise
 
+# Anthropic-compatible endpoints only cache prompt prefixes tagged with cache_control;
+# OpenAI caches stable prefixes automatically and doesn't need the tag.
+PROMPT_CACHE_CONTROL = os.environ.get("PROMPT_CACHE_CONTROL", "").lower() in ("1", "true")
+
+
+def cacheable_system_message(content: str) -> dict:
+    """Builds a system message, marked as a cache breakpoint when enabled.
+
+    Only pass static content here: anything dynamic (search results, the query)
+    belongs in later messages, or it invalidates the cached prefix."""
+    if not PROMPT_CACHE_CONTROL:
+        return {"role": "system", "content": content}
+    return {
+        "role": "system",
+        "content": [
+            {"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}
+        ],
+    }
+
+
 MIN_CHUNK_SIZE = 140
 encoder = tiktoken.get_encoding(
     "cl100k_base"
 )  # Updated to use OpenAI's current encoding
 
 
+# Inputs longer than this aren't memoized, so the cache can't pin huge strings
+# (e.g. the learnings passed to write_final_report).
+TRIM_CACHE_MAX_CHARS = 200_000
+
+
 def trim_prompt(
     prompt: str, context_size: int = int(os.environ.get("CONTEXT_SIZE", "128000"))
 ) -> str:
     """Trims a prompt to fit within the specified context size."""
+    if not prompt:
+        return ""
+    if len(prompt) > TRIM_CACHE_MAX_CHARS:
+        return _trim_prompt(prompt, context_size)
+    return _cached_trim_prompt(prompt, context_size)
+
+
+# Search results for the same URL come back across research depths, so memoize
+# to avoid re-tokenizing identical contents. Only the outer call is cached, not
+# the intermediate slices from the recursion.
+@lru_cache(maxsize=256)
+def _cached_trim_prompt(prompt: str, context_size: int) -> str:
+    return _trim_prompt(prompt, context_size)
+
+
+def _trim_prompt(prompt: str, context_size: int) -> str:
     if not prompt:
         return ""
 
@@ -59,7 +104,7 @@ def trim_prompt(
 
     # Handle edge case where trimmed prompt is same length
     if len(trimmed_prompt) == len(prompt):
-        return trim_prompt(prompt[:chunk_size], context_size)
+        return _trim_prompt(prompt[:chunk_size], context_size)
 
-    return trim_prompt(trimmed_prompt, context_size)
+    return _trim_prompt(trimmed_prompt, context_size)
 
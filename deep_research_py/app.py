@@ -1,10 +1,29 @@
 import gradio as gr
 import asyncio
-from typing import List, Dict
-from deep_research import deep_research, write_final_report
-from feedback import generate_feedback
+import functools
+import time
+from typing import Dict, List, Optional, Tuple
 import os
 
+# 超过该长度的报告按章节拆分到折叠面板中，避免前端一次性渲染整篇 Markdown 导致卡顿
+LARGE_REPORT_CHARS = 50_000
+MAX_REPORT_SECTIONS = 20
+# 超过该数量的列表改用 Dataframe 展示，gr.JSON 每次更新都会遍历整棵树
+LARGE_LIST_ITEMS = 100
+# 流式生成报告时两次刷新界面的最小间隔（秒），避免前端频繁重新渲染 Markdown
+STREAM_UPDATE_INTERVAL = 0.5
+
+# 研究相关模块会连带导入 openai、tiktoken、numpy 等依赖，延迟到首次使用时再导入，加快界面启动
+@functools.cache
+def _get_deep_research():
+    from deep_research import deep_research, write_final_report_stream
+    return deep_research, write_final_report_stream
+
+@functools.cache
+def _get_feedback():
+    from feedback import generate_feedback
+    return generate_feedback
+
 class ResearchSession:
     """管理研究会话的状态"""
     def __init__(self):
@@ -30,7 +49,8 @@ class ResearchSession:
         return f"Initial Query: {self.query}\nFollow-up Questions and Answers:\n{qa_text}"
 
 async def research_handler(session: ResearchSession, progress=gr.Progress()) -> Dict:
-    """执行研究流程：调用深度搜索和生成最终报告"""
+    """执行深度搜索，返回研究发现和参考来源（最终报告随后以流式方式生成）"""
+    deep_research, _ = _get_deep_research()
     progress(0.1, desc="开始研究...")
     research_results = await deep_research(
         query=session.get_combined_query(),
@@ -39,34 +59,100 @@ async def research_handler(session: ResearchSession, progress=gr.Progress()) ->
         concurrency=2
     )
     progress(0.7, desc="生成报告...")
-    report = await write_final_report(
-        prompt=session.get_combined_query(),
-        learnings=research_results["learnings"],
-        visited_urls=research_results["visited_urls"],
-        report_language=session.report_language
-    )
-    progress(1.0, desc="完成!")
     return {
-        "title": report["title"],
-        "report": report["final_report"],
         "learnings": research_results["learnings"],
         "sources": research_results["visited_urls"]
     }
 
-# 全局会话对象（注意：多用户场景下需更严格的状态管理）
-session = ResearchSession()
+def parse_report_title(report: str) -> str:
+    """从（可能仍在生成中的）报告开头解析一级标题，标题行尚未完整时返回空字符串"""
+    for line in report[:1000].splitlines(keepends=True):
+        if line.strip():
+            if line.startswith("# ") and line.endswith("\n"):
+                return line[2:].strip()
+            return ""
+    return ""
+
+def fallback_report_title(report: str, query: str) -> str:
+    """模型未在首行输出标题时的兜底：取报告正文中的第一个标题，否则使用研究主题"""
+    # 末尾的参考来源章节是程序追加的，不作为标题
+    body = report.rpartition("\n\n## Sources\n\n")[0] or report
+    for line in body.splitlines():
+        if line.startswith("#"):
+            title = line.lstrip("#").strip()
+            if title:
+                return title
+    return query.strip()[:100]
 
-async def on_get_questions_fixed(query_text: str, use_search_enhancement: bool = True):
+def split_report_sections(report: str) -> List[Tuple[str, str]]:
+    """按一、二级标题拆分报告，返回 (章节标题, 章节内容)，超出上限的章节合并到最后一节。
+    代码块（```）内以 # 开头的行不视为标题"""
+    sections: List[Tuple[str, str]] = []
+    title, lines = "", []
+    in_fence = False
+    for line in report.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not in_fence and line.startswith(("# ", "## ")):
+            if lines:
+                sections.append((title, "\n".join(lines)))
+            title, lines = line.lstrip("#").strip(), [line]
+        else:
+            lines.append(line)
+    if lines:
+        sections.append((title, "\n".join(lines)))
+    if len(sections) > MAX_REPORT_SECTIONS:
+        last = MAX_REPORT_SECTIONS - 1
+        merged = "\n".join(content for _, content in sections[last:])
+        sections = sections[:last] + [(sections[last][0], merged)]
+    return sections
+
+def report_updates(report: str) -> List[Dict]:
+    """报告组件的更新：完整 Markdown + 各章节折叠面板 + 各章节 Markdown"""
+    if len(report) <= LARGE_REPORT_CHARS:
+        return [gr.update(value=report, visible=True)] + hidden_report_sections()
+    sections = split_report_sections(report)
+    boxes, mds = [], []
+    for i in range(MAX_REPORT_SECTIONS):
+        if i < len(sections):
+            title, content = sections[i]
+            boxes.append(gr.update(visible=True, label=title or f"第 {i+1} 部分"))
+            mds.append(gr.update(value=content))
+        else:
+            boxes.append(gr.update(visible=False))
+            mds.append(gr.update(value=""))
+    return [gr.update(value="", visible=False)] + boxes + mds
+
+def hidden_report_sections() -> List[Dict]:
+    """隐藏全部章节折叠面板并清空其内容"""
+    return [gr.update(visible=False)] * MAX_REPORT_SECTIONS + [gr.update(value="")] * MAX_REPORT_SECTIONS
+
+def list_updates(items: List[str]) -> List[Dict]:
+    """列表结果的更新：(gr.JSON, gr.Dataframe)，数量较多时只显示 Dataframe"""
+    if len(items) > LARGE_LIST_ITEMS:
+        return [
+            gr.update(value=None, visible=False),
+            gr.update(value=[[item] for item in items], visible=True),
+        ]
+    return [gr.update(value=items, visible=True), gr.update(value=None, visible=False)]
+
+async def on_get_questions_fixed(
+    session: Optional[ResearchSession], query_text: str, use_search_enhancement: bool = True
+):
     """
     根据用户输入的研究主题生成跟进问题
     Args:
+        session: 当前浏览器会话的状态（gr.State），首次调用时为 None
         query_text: 研究主题
         use_search_enhancement: 是否使用搜索增强
     更新会话中的问题列表，并返回：
+      - 更新后的会话状态
       - 问题展示的 Markdown 内容
       - 对于最多 10 个答案输入框的更新信息
     """
+    session = session or ResearchSession()
     session.set_query(query_text)
+    generate_feedback = _get_feedback()
     questions = await generate_feedback(query=query_text, use_search_enhancement=use_search_enhancement)
     session.set_questions(questions)
     if questions:
@@ -80,26 +166,66 @@ async def on_get_questions_fixed(query_text: str, use_search_enhancement: bool =
             updates.append(gr.update(visible=True, label=f"回答 {i+1}（问题：{questions[i]}）"))
         else:
             updates.append(gr.update(visible=False))
-    return [md] + updates
+    return [session, md] + updates
 
-async def on_start_research_async(*args):
+async def on_start_research_async(session: Optional[ResearchSession], *args):
     """
     收集答案以及参数输入（最后 3 个为：lang, breadth, depth），更新会话状态，
-    然后调用研究流程，返回研究结果（标题、报告、研究发现、参考来源）。
+    然后调用研究流程。研究发现和参考来源在搜索完成后立即输出，报告随生成过程
+    逐步输出（标题在第一行生成后即显示），最后输出完成提示。
     """
-    # 根据输入参数数量计算：前面所有为答案
-    answers = list(args[:-3])
+    session = session or ResearchSession()
+    # 根据输入参数数量计算：前面所有为答案，跳过空白答案
     lang = args[-3]
     breadth = args[-2]
     depth = args[-1]
-    valid_answers = [a for a in answers if a and a.strip() != ""]
-    session.set_answers(valid_answers)
+    session.set_answers([a for a in args[:-3] if a and not a.isspace()])
     session.report_language = lang
     session.breadth = breadth
     session.depth = depth
     results = await research_handler(session)
+    _, write_final_report_stream = _get_deep_research()
+
+    unchanged_lists = [gr.update()] * 4
+    # 先输出研究发现和参考来源，之后不再重复发送，避免 JSON 组件反复渲染
+    yield (
+        [session, gr.update(), gr.update(), gr.update(value="", visible=True)]
+        + hidden_report_sections()
+        + list_updates(results["learnings"])
+        + list_updates(results["sources"])
+        + [gr.update()]
+    )
+
+    title, report, last_update = "", "", 0.0
+    async for chunk in write_final_report_stream(
+        prompt=session.get_combined_query(),
+        learnings=results["learnings"],
+        visited_urls=results["sources"],
+        report_language=session.report_language
+    ):
+        report += chunk
+        title = title or parse_report_title(report)
+        now = time.monotonic()
+        if now - last_update < STREAM_UPDATE_INTERVAL:
+            continue
+        last_update = now
+        # 报告超长后不再实时渲染，生成完毕后按章节拆分展示
+        report_md = gr.update(value=report) if len(report) <= LARGE_REPORT_CHARS else gr.update()
+        yield (
+            [session, title, gr.update(), report_md]
+            + [gr.update()] * (2 * MAX_REPORT_SECTIONS)
+            + unchanged_lists
+            + [gr.update()]
+        )
+
+    title = title or fallback_report_title(report, session.query)
     notice = "<h2 style='color: green; text-align: center;'>报告生成完毕！</h2>"
-    return [results["title"], results["report"], results["learnings"], results["sources"], notice]
+    yield (
+        [session, title, report]
+        + report_updates(report)
+        + unchanged_lists
+        + [notice]
+    )
 
 def create_ui():
     with gr.Blocks(
@@ -109,6 +235,9 @@ def create_ui():
             secondary_hue="indigo",
         ),
     ) as app:
+        # 每个浏览器会话独立的 ResearchSession，首次使用时创建
+        session_state = gr.State(value=None)
+
         gr.Markdown(
             """
             # 🔍 Deep Research Assistant
@@ -220,7 +349,7 @@ def create_ui():
                 elem_classes="notice"
             )
             
-            with gr.Accordion("📑 研究报告", open=False):
+            with gr.Accordion("📑 研究报告", open=True):
                 title_out = gr.Textbox(
                     label="报告标题",
                     elem_classes="report-title"
@@ -229,6 +358,17 @@ def create_ui():
                     label="研究报告",
                     elem_classes="report-content"
                 )
+                # 长报告按章节拆分展示
+                report_sections = []
+                report_section_mds = []
+                for i in range(MAX_REPORT_SECTIONS):
+                    with gr.Accordion(f"第 {i+1} 部分", open=False, visible=False) as section:
+                        report_section_mds.append(
+                            gr.Markdown(elem_classes="report-content")
+                        )
+                    report_sections.append(section)
+                # 保存完整报告原文，供下载使用
+                report_raw = gr.Textbox(visible=False)
             
             with gr.Row():
                 with gr.Column():
@@ -236,11 +376,25 @@ def create_ui():
                         label="🔍 研究发现",
                         elem_classes="findings"
                     )
+                    learnings_df = gr.Dataframe(
+                        headers=["研究发现"],
+                        label="🔍 研究发现",
+                        visible=False,
+                        wrap=True,
+                        max_height=300
+                    )
                 with gr.Column():
                     sources_out = gr.JSON(
                         label="📚 参考来源",
                         elem_classes="sources"
                     )
+                    sources_df = gr.Dataframe(
+                        headers=["参考来源"],
+                        label="📚 参考来源",
+                        visible=False,
+                        wrap=True,
+                        max_height=300
+                    )
 
         # 添加自定义CSS
         gr.Markdown("""
@@ -274,19 +428,22 @@ def create_ui():
         # 事件绑定保持不变
         get_questions_btn.click(
             fn=on_get_questions_fixed,
-            inputs=[query, use_search],
-            outputs=[questions_md] + answer_boxes
+            inputs=[session_state, query, use_search],
+            outputs=[session_state, questions_md] + answer_boxes
         )
         
         start_btn.click(
             fn=on_start_research_async,
-            inputs=answer_boxes + [language, breadth, depth],
-            outputs=[title_out, report_out, learnings_out, sources_out, completion_notice]
+            inputs=[session_state] + answer_boxes + [language, breadth, depth],
+            outputs=[session_state, title_out, report_raw, report_out]
+            + report_sections
+            + report_section_mds
+            + [learnings_out, learnings_df, sources_out, sources_df, completion_notice]
         )
         
         download_btn.click(
             fn=lambda report: report,
-            inputs=[report_out],
+            inputs=[report_raw],
             outputs=[],
             js="""
             (report) => {
@@ -304,4 +461,6 @@ def create_ui():
 
 if __name__ == "__main__":
     app = create_ui()
+    # 搜索连接池绑定在 Gradio 服务端的事件循环上，launch 返回时该循环已关闭，
+    # 无法在新循环中关闭，由进程退出时统一释放
     app.launch(share=True) 
\ No newline at end of file
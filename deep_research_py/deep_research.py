@@ -1,13 +1,13 @@
 import asyncio
-import json
 import os
 from dataclasses import dataclass
-from typing import Dict, List, Optional, TypedDict
+from typing import AsyncIterator, Dict, List, Optional, TypedDict
 
 from ai.providers import openai_client, trim_prompt
+import orjson
 from loguru import logger
 from prompt import system_prompt
-from search_engine import SearchEngine, SearchEngineType, SearchResponse
+from search_engine import SearchEngine, SearchEngineType, SearchResponse, exclude_urls
 
 
 class ResearchResult(TypedDict):
@@ -33,23 +33,20 @@ async def generate_serp_queries(
     if learnings:
         prompt += f"\n\nHere are some learnings from previous research, use them to generate more specific queries: {' '.join(learnings)}"
 
-    response = await asyncio.get_event_loop().run_in_executor(
-        None,
-        lambda: openai_client.chat.completions.create(
-            model=os.getenv("REASONING_MODEL", "o3-mini"),
-            messages=[
-                {"role": "system", "content": system_prompt()},
-                {"role": "user", "content": prompt},
-            ],
-            response_format={"type": "json_object"},
-        ),
+    response = await openai_client.chat.completions.create(
+        model=os.getenv("REASONING_MODEL", "o3-mini"),
+        messages=[
+            {"role": "system", "content": system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        response_format={"type": "json_object"},
     )
 
     try:
-        result = json.loads(response.choices[0].message.content)
+        result = orjson.loads(response.choices[0].message.content)
         queries = result.get("queries", [])
         return [SerpQuery(**q) for q in queries][:num_queries]
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
         print(f"Raw response: {response.choices[0].message.content}")
         return []
@@ -63,11 +60,11 @@ async def process_serp_result(
 ) -> Dict[str, List[str]]:
     """Process search results to extract learnings and follow-up questions. 处理搜索结果，提取学习内容和跟进问题。"""
 
-    contents = [
-        trim_prompt(item.get("markdown", ""), 25_000)
-        for item in search_result["data"]
-        if item.get("markdown")
-    ]
+    markdowns = [item["markdown"] for item in search_result["data"] if item.get("markdown")]
+    # Tokenizing is CPU bound, trim in worker threads to keep the event loop free
+    contents = await asyncio.gather(
+        *(asyncio.to_thread(trim_prompt, markdown, 25_000) for markdown in markdowns)
+    )
 
     # Create the contents string separately
     contents_str = "".join(f"<content>\n{content}\n</content>" for content in contents)
@@ -81,47 +78,55 @@ async def process_serp_result(
         f"<contents>{contents_str}</contents>"
     )
 
-    response = await asyncio.get_event_loop().run_in_executor(
-        None,
-        lambda: openai_client.chat.completions.create(
-            model=os.getenv("REASONING_MODEL", "o3-mini"),
-            messages=[
-                {"role": "system", "content": system_prompt()},
-                {"role": "user", "content": prompt},
-            ],
-            response_format={"type": "json_object"},
-        ),
+    response = await openai_client.chat.completions.create(
+        model=os.getenv("REASONING_MODEL", "o3-mini"),
+        messages=[
+            {"role": "system", "content": system_prompt()},
+            {"role": "user", "content": prompt},
+        ],
+        response_format={"type": "json_object"},
     )
 
     try:
-        result = json.loads(response.choices[0].message.content)
+        result = orjson.loads(response.choices[0].message.content)
         return {
             "learnings": result.get("learnings", [])[:num_learnings],
             "followUpQuestions": result.get("followUpQuestions", [])[
                 :num_follow_up_questions
             ],
         }
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
         print(f"Raw response: {response.choices[0].message.content}")
         return {"learnings": [], "followUpQuestions": []}
 
 
-async def write_final_report(
-    prompt: str, learnings: List[str], visited_urls: List[str], report_language: str = "zh"
-) -> str:
-    """Generate final report based on all research learnings."""
-
-    learnings_string = trim_prompt(
+def _learnings_string(learnings: List[str]) -> str:
+    return trim_prompt(
         "\n".join([f"<learning>\n{learning}\n</learning>" for learning in learnings]),
         150_000,
     )
+
+
+def _report_language_name(report_language: str) -> str:
     if report_language == "zh":
-        report_language = "Chinese"
+        return "Chinese"
     elif report_language == "en":
-        report_language = "English"
-    else:
-        raise ValueError(f"Invalid report language: {report_language}")
+        return "English"
+    raise ValueError(f"Invalid report language: {report_language}")
+
+
+def _sources_section(visited_urls: List[str]) -> str:
+    return "\n\n## Sources\n\n" + "\n".join([f"- {url}" for url in visited_urls])
+
+
+async def write_final_report(
+    prompt: str, learnings: List[str], visited_urls: List[str], report_language: str = "zh"
+) -> str:
+    """Generate final report based on all research learnings."""
+
+    learnings_string = _learnings_string(learnings)
+    report_language = _report_language_name(report_language)
     logger.info(f"Writing final report in {report_language}")
     
     user_prompt = (
@@ -134,37 +139,69 @@ async def write_final_report(
         f"Here are all the learnings from research:\n\n<learnings>\n{learnings_string}\n</learnings>"
     )
 
-    response = await asyncio.get_event_loop().run_in_executor(
-        None,
-        lambda: openai_client.chat.completions.create(
-            model=os.getenv("REASONING_MODEL", "o3-mini"),
-            messages=[
-                {"role": "system", "content": system_prompt()},
-                {"role": "user", "content": user_prompt},
-            ],
-            response_format={"type": "json_object"},
-        ),
+    response = await openai_client.chat.completions.create(
+        model=os.getenv("REASONING_MODEL", "o3-mini"),
+        messages=[
+            {"role": "system", "content": system_prompt()},
+            {"role": "user", "content": user_prompt},
+        ],
+        response_format={"type": "json_object"},
     )
 
     try:
-        result = json.loads(response.choices[0].message.content)
+        result = orjson.loads(response.choices[0].message.content)
         report = result.get("reportMarkdown", "")
         title = result.get("title", "")
         
         # Append sources
-        urls_section = "\n\n## Sources\n\n" + "\n".join(
-            [f"- {url}" for url in visited_urls]
-        )
         return dict(
             title = title,
-            final_report = report + urls_section
+            final_report = report + _sources_section(visited_urls)
         )
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
         print(f"Raw response: {response.choices[0].message.content}")
         return "Error generating report"
 
 
+async def write_final_report_stream(
+    prompt: str, learnings: List[str], visited_urls: List[str], report_language: str = "zh"
+) -> AsyncIterator[str]:
+    """Stream the final report as markdown chunks while it is being generated.
+
+    The report starts with a '# ' header holding its title and ends with the
+    sources section, so callers can show the title as soon as the first line arrives.
+    """
+
+    learnings_string = _learnings_string(learnings)
+    report_language = _report_language_name(report_language)
+    logger.info(f"Streaming final report in {report_language}")
+
+    user_prompt = (
+        f"Given the following prompt from the user, write a final report on the topic using "
+        f"the learnings from research in **{report_language}**. "
+        f"Return only the report as markdown. Start with a single top-level header ('# ') "
+        f"containing a concise, descriptive title for the report, followed by a detailed "
+        f"markdown report (aim for 3+ pages). Include ALL the learnings "
+        f"from research:\n\n<prompt>{prompt}</prompt>\n\n"
+        f"Here are all the learnings from research:\n\n<learnings>\n{learnings_string}\n</learnings>"
+    )
+
+    stream = await openai_client.chat.completions.create(
+        model=os.getenv("REASONING_MODEL", "o3-mini"),
+        messages=[
+            {"role": "system", "content": system_prompt()},
+            {"role": "user", "content": user_prompt},
+        ],
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+    yield _sources_section(visited_urls)
+
+
 async def deep_research(
     query: str,
     breadth: int,
@@ -198,9 +235,24 @@ async def deep_research(
         async with semaphore:
             try:
                 # Search for content
-                result = await search_engine.search(
+                raw_result = await search_engine.search(
                     serp_query.query, timeout=15000, limit=5
                 )
+                # Skip pages already read at an earlier depth of this branch
+                result = exclude_urls(raw_result, visited_urls)
+                if raw_result["data"] and not result["data"]:
+                    # A paraphrased follow-up query can get the parent query's results
+                    # from the semantic cache, all of them already visited. Search for
+                    # this exact query instead. Failed or empty searches aren't retried.
+                    result = exclude_urls(
+                        await search_engine.search(
+                            serp_query.query,
+                            timeout=15000,
+                            limit=5,
+                            use_semantic_cache=False,
+                        ),
+                        visited_urls,
+                    )
 
                 # Collect new URLs
                 new_urls = [
@@ -1,15 +1,39 @@
 import asyncio
-import json
 import os
+from functools import lru_cache
 from typing import List
 
-from ai.providers import openai_client, trim_prompt
+from ai.cache import semantic_cache
+from ai.providers import cacheable_system_message, openai_client, trim_prompt
+import orjson
 from loguru import logger
 from prompt import system_prompt
 from search_engine import SearchResponse, SearchEngine, SearchEngineType
 from translate import translate_to_english
 from datetime import datetime
 
+# Kept out of the user message so the system prompt + task form a stable,
+# cacheable prefix; only the topic and search context vary between calls.
+FEEDBACK_TASK = (
+    "TASK: Given a research topic, generate 3-5 follow-up questions to better "
+    "understand the user's research needs. "
+    "Return the response as a JSON object with a 'questions' array field."
+)
+
+@lru_cache(maxsize=4)
+def _get_engine(engine_type: SearchEngineType):
+    """Returns a shared search engine instance instead of building one per call."""
+    return SearchEngine(engine_type).engine
+
+@semantic_cache(
+    "generate_feedback",
+    "REASONING_MODEL",
+    "o3-mini",
+    key=lambda query, use_search_enhancement=True: (
+        query,
+        f"search={use_search_enhancement}",
+    ),
+)
 async def generate_feedback(query: str, use_search_enhancement: bool = True) -> List[str]:
     """Generates follow-up questions to clarify research direction.
     
@@ -20,44 +44,40 @@ async def generate_feedback(query: str, use_search_enhancement: bool = True) ->
     
     context = ""
     if use_search_enhancement:
-        search_engine = SearchEngine(SearchEngineType.TAVILY).engine
-        # Get background knowledge through search
-        query = await translate_to_english(query)
-        search_result = await search_engine.search(query, limit=5)
-        contents = [
-            trim_prompt(item.get("markdown", ""), 15_000)
-            for item in search_result["data"]
-            if item.get("markdown")
-        ]
+        search_engine = _get_engine(SearchEngineType.TAVILY)
+        # Get background knowledge through search. Tavily handles non-English
+        # queries, so search with the original query while translating it for the
+        # LLM prompt instead of waiting for the translation first.
+        query, search_result = await asyncio.gather(
+            translate_to_english(query), search_engine.search(query, limit=5)
+        )
+        markdowns = [item["markdown"] for item in search_result["data"] if item.get("markdown")]
+        # Tokenizing is CPU bound, trim in worker threads to keep the event loop free
+        contents = await asyncio.gather(
+            *(asyncio.to_thread(trim_prompt, markdown, 15_000) for markdown in markdowns)
+        )
         search_answer = search_result.get("answer", "")
-        context = "\n\nHere is some background information about the topic:\n" + \
-                 "".join(f"<content>\n{content}\n</content>" for content in contents) + \
-                 f"{search_answer}"
+        parts = ["\n\nHere is some background information about the topic:"]
+        parts.extend(f"<content>\n{content}\n</content>" for content in contents)
+        parts.append(search_answer)
+        context = "\n".join(parts)
         logger.info(f"Search result: {context}")
         
     # Run OpenAI call with optional context
-    response = await asyncio.get_event_loop().run_in_executor(
-        None,
-        lambda: openai_client.chat.completions.create(
-            model=os.getenv("REASONING_MODEL", "o3-mini"),
-            messages=[
-                {"role": "system", "content": system_prompt()},
-                {
-                    "role": "user",
-                    "content": f"Given this research topic: {query}{context}, "
-                    "generate 3-5 follow-up questions to better understand the user's research needs. "
-                    "Return the response as a JSON object with a 'questions' array field.",
-                },
-            ],
-            response_format={"type": "json_object"},
-        ),
+    response = await openai_client.chat.completions.create(
+        model=os.getenv("REASONING_MODEL", "o3-mini"),
+        messages=[
+            cacheable_system_message(f"{system_prompt()}\n\n{FEEDBACK_TASK}"),
+            {"role": "user", "content": f"Research topic: {query}{context}"},
+        ],
+        response_format={"type": "json_object"},
     )
 
     # Parse the JSON response
     try:
-        result = json.loads(response.choices[0].message.content)
+        result = orjson.loads(response.choices[0].message.content)
         return result.get("questions", [])
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
         print(f"Raw response: {response.choices[0].message.content}")
         return []
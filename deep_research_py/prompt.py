@@ -2,8 +2,11 @@ from datetime import datetime
 
 
 def system_prompt() -> str:
-    """Creates the system prompt with current timestamp."""
-    now = datetime.now().isoformat()
+    """Creates the system prompt with the current date.
+
+    Only the date is included (not the full timestamp) so the prompt stays
+    identical across calls made on the same day and can be prefix-cached."""
+    now = datetime.now().date().isoformat()
     return f"""You are an expert researcher. Today is {now}. Follow these instructions when responding:
     - You may be asked to research subjects that is after your knowledge cutoff, assume the user is right when presented with news.
     - The user is a highly experienced analyst, no need to simplify it, be as detailed as possible and make sure your response is correct.
@@ -5,6 +5,7 @@ from functools import wraps
 import typer
 from deep_research import deep_research, write_final_report
 from feedback import generate_feedback
+from search_engine import close_http_client
 from prompt_toolkit import PromptSession
 from rich import print as rprint
 from rich.console import Console
@@ -19,7 +20,14 @@ session = PromptSession()
 def coro(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
+        async def run_and_cleanup():
+            try:
+                return await f(*args, **kwargs)
+            finally:
+                # Close pooled search connections on the loop that opened them
+                await close_http_client()
+
+        return asyncio.run(run_and_cleanup())
 
     return wrapper
 
@@ -1,15 +1,86 @@
-import asyncio
 import os
 from enum import Enum
-from typing import Dict, List, Optional, TypedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, TypedDict
+from urllib.parse import urlsplit
 
-from firecrawl import FirecrawlApp
-from tavily import TavilyClient
+from ai.cache import semantic_cache
 from loguru import logger
 
+TAVILY_API_URL = "https://api.tavily.com"
+
+# Shared keep-alive connection pool for all search backends, so repeated searches
+# reuse warm (HTTP/2 where supported) connections instead of new TLS handshakes.
+# Created on first use to keep httpx/h2 out of startup.
+_HTTP = None
+
+
+def _http_client():
+    global _HTTP
+    if _HTTP is None:
+        import httpx
+
+        _HTTP = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=httpx.Timeout(30.0, connect=5.0),
+        )
+    return _HTTP
+
+
+async def close_http_client() -> None:
+    """Closes the shared search HTTP client, call once on app shutdown."""
+    global _HTTP
+    if _HTTP is not None:
+        await _HTTP.aclose()
+        _HTTP = None
+
 class SearchResponse(TypedDict):
     data: List[Dict[str, str]]
 
+def canonical_url(url: str) -> str:
+    """Drops the fragment so links to sections of the same page compare equal."""
+    return urlsplit(url)._replace(fragment="").geturl()
+
+def dedupe_results(
+    items: List[Dict[str, str]], seen: Optional[Set[str]] = None
+) -> List[Dict[str, str]]:
+    """Keeps the first result per canonical URL, skipping URLs already in `seen`.
+
+    `seen` is updated in place with the URLs that were kept."""
+    seen = set() if seen is None else seen
+    unique = []
+    for item in items:
+        url = item.get("url")
+        if url:
+            url = canonical_url(url)
+            if url in seen:
+                continue
+            seen.add(url)
+        unique.append(item)
+    return unique
+
+def exclude_urls(response: SearchResponse, urls: Iterable[str]) -> SearchResponse:
+    """Returns a copy of `response` without results for any of `urls`, e.g. pages
+    already read at an earlier research depth. Cached responses are left untouched."""
+    seen = {canonical_url(url) for url in urls}
+    if not seen:
+        return response
+    return {**response, "data": dedupe_results(response["data"], seen)}
+
+def _search_cache_key(engine, query: str, timeout: int = 15000, limit: int = 5):
+    return query, f"{type(engine).__name__}:limit={limit}"
+
+
+# Recursive research issues many overlapping queries; reuse results for an hour,
+# including for paraphrased queries that embed almost identically.
+cached_search = semantic_cache(
+    "search",
+    threshold=0.95,
+    ttl=3600,
+    key=_search_cache_key,
+    cache_if=lambda response: bool(response["data"]),
+)
+
 class SearchEngineType(Enum):
     FIRECRAWL = "firecrawl"
     TAVILY = "tavily"
@@ -22,53 +93,61 @@ class SearchEngine(object):
         elif self.engine_type == SearchEngineType.TAVILY:
             self.engine = Tavily(api_key=os.environ.get("TAVILY_KEY", ""))
 
+def _adapt_dict_data(response: Dict) -> SearchResponse:
+    # Response is already in the right format
+    return {**response, "data": dedupe_results(response["data"])}
+
+def _adapt_dict_success(response: Dict) -> SearchResponse:
+    # Response is in the documented format
+    return {"data": dedupe_results(response.get("data", []))}
+
+def _adapt_list(response: List[Dict[str, str]]) -> SearchResponse:
+    # Response is a list of results
+    return {"data": dedupe_results([item for item in response if isinstance(item, dict)])}
+
 class Firecrawl:
-    """Simple wrapper for Firecrawl SDK."""
+    """Simple async wrapper for the Firecrawl REST API."""
+
+    # The API answers every search in the same shape, so the matching adapter is
+    # picked from the first response and reused without per-call type checks.
+    _adapter: Optional[Callable[[Any], SearchResponse]] = None
+
+    @classmethod
+    def _detect_adapter(cls, response: Any) -> Optional[Callable[[Any], SearchResponse]]:
+        if isinstance(response, dict) and "data" in response:
+            cls._adapter = _adapt_dict_data
+        elif isinstance(response, dict) and "success" in response:
+            cls._adapter = _adapt_dict_success
+        elif isinstance(response, list):
+            cls._adapter = _adapt_list
+        return cls._adapter
 
     def __init__(self, api_key: str = "", api_url: Optional[str] = None):
-        self.app = FirecrawlApp(api_key=api_key, api_url=api_url)
+        self.api_key = api_key
+        self.api_url = (
+            api_url or os.environ.get("FIRECRAWL_API_URL") or "https://api.firecrawl.dev"
+        ).rstrip("/")
 
+    @cached_search
     async def search(
         self, query: str, timeout: int = 15000, limit: int = 5
     ) -> SearchResponse:
-        """Search using Firecrawl SDK in a thread pool to keep it async."""
+        """Search using the Firecrawl /v1/search endpoint."""
         try:
-            # Run the synchronous SDK call in a thread pool
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.app.search(
-                    query=query,
-                ),
+            http_response = await _http_client().post(
+                f"{self.api_url}/v1/search",
+                json={"query": query, "limit": limit, "timeout": timeout},
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=timeout / 1000 + 5,
             )
+            http_response.raise_for_status()
+            response = http_response.json()
 
-            # Handle the response format from the SDK
-            if isinstance(response, dict) and "data" in response:
-                # Response is already in the right format
-                return response
-            elif isinstance(response, dict) and "success" in response:
-                # Response is in the documented format
-                return {"data": response.get("data", [])}
-            elif isinstance(response, list):
-                # Response is a list of results
-                formatted_data = []
-                for item in response:
-                    if isinstance(item, dict):
-                        formatted_data.append(item)
-                    else:
-                        # Handle non-dict items (like objects)
-                        formatted_data.append(
-                            {
-                                "url": getattr(item, "url", ""),
-                                "markdown": getattr(item, "markdown", "")
-                                or getattr(item, "content", ""),
-                                "title": getattr(item, "title", "")
-                                or getattr(item, "metadata", {}).get("title", ""),
-                            }
-                        )
-                return {"data": formatted_data}
-            else:
+            adapter = Firecrawl._adapter or Firecrawl._detect_adapter(response)
+            if adapter is None:
                 logger.error(f"Unexpected response format from Firecrawl: {type(response)}")
                 return {"data": []}
+            return adapter(response)
 
         except Exception as e:
             logger.error(f"Error searching with Firecrawl: {e}")
@@ -80,26 +159,30 @@ class Firecrawl:
     
 class Tavily:
     def __init__(self, api_key: str = ""):
-        self.client = TavilyClient(api_key=api_key)
+        self.api_key = api_key
         
+    @cached_search
     async def search(
         self, query: str, timeout: int=15_000, limit: int=5
     ) -> SearchResponse:
-        """Search using Tavily SDK in a thread pool to keep it async."""
+        """Search using the Tavily /search endpoint."""
         try:
-            # Run the synchronous SDK call in a thread pool
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.search(
-                    query=query,
-                    search_depth="advanced",
-                    topic="general", # general or news
-                    days=5, # only used if topic is news
-                    max_results=limit,
-                    include_answer=True,
-                    include_raw_content=True,
-                )
+            http_response = await _http_client().post(
+                f"{TAVILY_API_URL}/search",
+                json={
+                    "query": query,
+                    "search_depth": "advanced",
+                    "topic": "general", # general or news
+                    "days": 5, # only used if topic is news
+                    "max_results": limit,
+                    "include_answer": True,
+                    "include_raw_content": True,
+                },
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=60, # advanced searches with raw content can be slow
             )
+            http_response.raise_for_status()
+            response = http_response.json()
             formatted_data = []
             results = response.get("results", [])
             if results:
@@ -107,9 +190,9 @@ class Tavily:
                     formatted_data.append({
                         "title": item.get("title", ""),
                         "url": item.get("url", ""),
-                        "markdown": item.get("published_date", "") + "\n" + item.get("content", "")
+                        "markdown": (item.get("published_date") or "") + "\n" + item.get("content", "")
                     })
-                return {"data": formatted_data, "answer": response.get("answer", "")}
+                return {"data": dedupe_results(formatted_data), "answer": response.get("answer", "")}
             else:
                 logger.error(f"Unexpected response format from Tavily: {response}")
                 return {"data": []}
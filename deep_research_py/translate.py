@@ -1,11 +1,22 @@
-import asyncio
-import json
 import os
+import re
 from typing import Optional
 
-from ai.providers import openai_client
+from ai.cache import semantic_cache
+from ai.providers import cacheable_system_message, openai_client
+import orjson
 from loguru import logger
 
+# CJK Unified Ideographs; the regex engine scans in C and stops at the first hit
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+
+# Must stay byte-identical across calls so providers can cache the prefix
+TRANSLATOR_PROMPT = (
+    "You are a professional translator. Translate the given Chinese text to English "
+    "accurately and naturally. Return the response as a JSON object with a "
+    "'translation' field."
+)
+
 
 async def translate_to_english(query: str) -> str:
     """
@@ -19,37 +30,41 @@ async def translate_to_english(query: str) -> str:
     """
     try:
         # 检查是否需要翻译（包含中文字符）
-        if not any(u'\u4e00' <= char <= u'\u9fff' for char in query):
+        if _CJK_RE.search(query) is None:
             return query
             
-        # 使用与其他部分相同的异步模式调用 OpenAI API
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: openai_client.chat.completions.create(
-                model=os.getenv("TRANSLATION_MODEL", "gpt-4o-mini"),
-                messages=[
-                    {"role": "system", "content": "You are a professional translator. Translate the given Chinese text to English accurately and naturally."},
-                    {
-                        "role": "user", 
-                        "content": f"Translate the following query to English: {query}"
-                        "Return the response as a JSON object with a 'translation' field.",
-                    }
-                ],
-                temperature=0.2,  # Use lower temperature for more stable translations
-                top_p=0.75,
-                response_format={"type": "json_object"},
-            )
-        )
-        # Parse the JSON response
-        try:
-            result = json.loads(response.choices[0].message.content)
-            translated_text = result.get("translation", query)
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON response: {e}")
-            translated_text = query
-        logger.info(f"Translated '{query}' to '{translated_text}'")
-        return translated_text
-        
+        return await _translate(query)
     except Exception as e:
         logger.error(f"Translation error: {e}")
-        return query  # If translation fails, return the original query 
\ No newline at end of file
+        return query  # If translation fails, return the original query
+
+
+# Exact hits only: near-identical queries (e.g. differing only in a year or name)
+# embed almost identically but need different translations.
+@semantic_cache(
+    "translate_to_english", "TRANSLATION_MODEL", "gpt-4o-mini", semantic=False
+)
+async def _translate(query: str) -> str:
+    """Calls the translation model; raises on failure so errors are never cached."""
+    response = await openai_client.chat.completions.create(
+        model=os.getenv("TRANSLATION_MODEL", "gpt-4o-mini"),
+        messages=[
+            cacheable_system_message(TRANSLATOR_PROMPT),
+            {
+                "role": "user",
+                "content": f"Translate the following query to English: {query}",
+            },
+        ],
+        temperature=0.2,  # Use lower temperature for more stable translations
+        top_p=0.75,
+        response_format={"type": "json_object"},
+    )
+    # Parse the JSON response
+    try:
+        result = orjson.loads(response.choices[0].message.content)
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Error parsing JSON response: {e}")
+        raise
+    translated_text = result.get("translation", query)
+    logger.info(f"Translated '{query}' to '{translated_text}'")
+    return translated_text